@@ -4,16 +4,31 @@ Handles document queries with proper CORS headers
 """
 
 import os
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import asyncio
+import hashlib
+import io
+import json
+import re
+from datetime import datetime
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from typing import List
 from pydantic import BaseModel
+from cachetools import TTLCache
 import shutil
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import ollama
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.vectorstores import Chroma
-from langchain.embeddings import OllamaEmbeddings
+from langchain.schema import Document
+from langchain.vectorstores import FAISS
+from langchain.docstore.in_memory import InMemoryDocstore
+import faiss
+from langchain.embeddings.base import Embeddings
+from fastembed import TextEmbedding
+from pdf_loader import load_pdf
 
 # Initialize FastAPI app
 app = FastAPI(title="HR Policy RAG API", version="1.0.0", description="HR Policy document query system")
@@ -28,25 +43,132 @@ app.add_middleware(
 )
 
 # Configuration
-EMBEDDING_MODEL_NAME = "nomic-embed-text"  # Ollama embedding model
-LLM_MODEL_NAME = "gemma:2b"  # Local Llama model via Ollama
-CHROMA_PERSIST_DIR = './hr_policy_chroma_db'
+EMBEDDING_MODEL_NAME = "BAAI/bge-small-en-v1.5"  # In-process fastembed (ONNX) model, 384-dim
+EMBEDDING_BATCH = 64  # Texts per fastembed forward pass
+EMBEDDING_DIM = 384  # Vector size of bge-small-en-v1.5
+LLM_MODEL_NAME = "gemma:2b-instruct-q4_K_M"  # Q4_K_M GGUF quant via Ollama (ollama pull gemma:2b-instruct-q4_K_M)
+FAISS_PERSIST_DIR = './hr_policy_faiss_index'
+FAISS_INDEX_FILE = os.path.join(FAISS_PERSIST_DIR, 'index.faiss')  # HNSW graph + vectors (save_local layout)
+FAISS_DOCSTORE_FILE = os.path.join(FAISS_PERSIST_DIR, 'index.pkl')  # Docstore and id mapping
+HNSW_M = 32  # Neighbours per node in the HNSW graph
 UPLOAD_DIR = './hr_policy_pdfs'
+EMBEDDING_MARKER = os.path.join(FAISS_PERSIST_DIR, 'embedding_model.txt')  # Model the store was built with
+VECTORSTORE_ADD_BATCH = int(os.getenv("VECTORSTORE_ADD_BATCH", "200"))  # Chunks embedded/added per index write
+MAX_PDF_BYTES = int(os.getenv("MAX_PDF_BYTES", str(50 * 1024 * 1024)))  # Upload size cap per PDF
+UPLOAD_CHUNK_BYTES = 1024 * 1024  # Bytes read from an upload per write
+# The model queue, retriever and answer cache live in process memory, so extra
+# workers would each run their own generations and never see another worker's
+# upload or clear; keep one until that state is shared across processes
+WORKERS = int(os.getenv("WORKERS", "1"))
 
 # Ensure directories exist
-os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+os.makedirs(FAISS_PERSIST_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-# Initialize embedding model
+class FastEmbedEmbeddings(Embeddings):
+    """LangChain embeddings backed by an in-process fastembed model"""
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH):
+        self.model = TextEmbedding(model_name=model_name)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vector.tolist() for vector in self.model.embed(texts, batch_size=self.batch_size)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return next(iter(self.model.query_embed(text))).tolist()
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """LangChain embeddings backed by sentence-transformers on a GPU"""
+
+    def __init__(self, model_name: str, device: str = "cuda", batch_size: int = EMBEDDING_BATCH):
+        # Optional GPU dependency, only imported when CUDA is available
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device=device)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def cuda_available() -> bool:
+    """Whether torch is installed and can see a CUDA device"""
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+# Initialize embedding model, on the GPU when one is available
 try:
-    embedding = OllamaEmbeddings(model=EMBEDDING_MODEL_NAME)
-    print(f"✅ Initialized embedding model: {EMBEDDING_MODEL_NAME}")
+    if cuda_available():
+        embedding = SentenceTransformerEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        print(f"✅ Initialized embedding model on GPU: {EMBEDDING_MODEL_NAME}")
+    else:
+        embedding = FastEmbedEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        print(f"✅ Initialized embedding model: {EMBEDDING_MODEL_NAME}")
 except Exception as e:
     print(f"❌ Failed to initialize embedding model: {e}")
     embedding = None
 
-# Global variable for vectorstore
+# Global vectorstore and its cached retriever, swapped together under store_lock
 vectorstore = None
+retriever = None
+store_lock = threading.Lock()
+# Serializes read-add-save of the persisted index (and clearing it) across ingest threads
+ingest_lock = threading.Lock()
+
+# Generated answers keyed by normalised question hash, dropped whenever the store changes.
+# TTLCache is not thread-safe, so every access goes through store_lock
+_ANSWER_CACHE = TTLCache(maxsize=1024, ttl=3600)
+store_generation = 0  # Bumped on every store swap so in-flight answers can tell they are stale
+
+def set_vectorstore(store):
+    """Replace the global vectorstore, rebuild the cached retriever and drop cached answers"""
+    global vectorstore, retriever, store_generation
+    with store_lock:
+        _ANSWER_CACHE.clear()
+        store_generation += 1
+        vectorstore = store
+        retriever = store.as_retriever(
+            search_type="similarity",
+            search_kwargs={"k": 3}
+        ) if store is not None else None
+
+def current_retriever_and_generation():
+    """The serving retriever together with the store generation it belongs to"""
+    with store_lock:
+        return retriever, store_generation
+
+def get_cached_answer(key: bytes):
+    """Cached answer for a question key, or None"""
+    with store_lock:
+        return _ANSWER_CACHE.get(key)
+
+def cache_answer(key: bytes, generation: int, response):
+    """Cache an answer unless the store was replaced while it was being generated"""
+    with store_lock:
+        if generation == store_generation:
+            _ANSWER_CACHE[key] = response
+
+# Static parts of the /query prompt, the context and question go in between
+_PROMPT_PREFIX = """You are an HR Policy Assistant. Based on the following HR policy documents, please answer the question clearly and professionally.
+
+Context from HR Policy Documents:
+"""
+_PROMPT_MID = "\n\nQuestion: "
+_PROMPT_SUF = """
+
+Please provide a comprehensive answer based only on the information provided in the HR policy documents above. If the documents don't contain enough information to fully answer the question, please say so and suggest what additional information might be needed.
+
+Answer:"""
 
 # Data models
 class QueryRequest(BaseModel):
@@ -56,58 +178,254 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[str] = []
 
+def new_store():
+    """Create an empty FAISS store backed by an HNSW index"""
+    return FAISS(embedding, faiss.IndexHNSWFlat(EMBEDDING_DIM, HNSW_M), InMemoryDocstore({}), {})
+
+def read_store():
+    """Read the persisted FAISS store into memory, or None if nothing has been saved yet.
+
+    Writers add to a fresh copy from disk and then serve that copy, so the store
+    already answering queries is never mutated in place.
+    """
+    if not os.path.exists(FAISS_INDEX_FILE):
+        return None
+    with open(FAISS_DOCSTORE_FILE, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    index = faiss.read_index(FAISS_INDEX_FILE)
+    return FAISS(embedding, index, docstore, index_to_docstore_id)
+
+def add_chunks(store, texts: List[str], metadatas: List[dict]):
+    """Embed texts outside the vectorstore in bulk and add them to the index batch by batch"""
+    for start in range(0, len(texts), VECTORSTORE_ADD_BATCH):
+        batch_texts = texts[start:start + VECTORSTORE_ADD_BATCH]
+        store.add_embeddings(
+            list(zip(batch_texts, embedding.embed_documents(batch_texts))),
+            metadatas=metadatas[start:start + VECTORSTORE_ADD_BATCH]
+        )
+        print(f"🧩 Indexed {start + len(batch_texts)}/{len(texts)} chunks")
+
+def save_store(store):
+    """Persist the store and record which embedding model built it"""
+    store.save_local(FAISS_PERSIST_DIR)
+    write_embedding_marker()
+
+def write_embedding_marker():
+    """Record which embedding model the persisted store was built with"""
+    with open(EMBEDDING_MARKER, "w") as marker:
+        marker.write(EMBEDDING_MODEL_NAME)
+
+def reembed_store(store):
+    """Rebuild a store created with a different embedding model using the current one"""
+    existing = list(store.docstore._dict.values())
+
+    rebuilt = new_store()
+    add_chunks(rebuilt, [doc.page_content for doc in existing], [doc.metadata for doc in existing])
+    save_store(rebuilt)
+    print(f"🔁 Re-embedded {len(existing)} chunks with {EMBEDDING_MODEL_NAME}")
+    return rebuilt
+
+# Chunk boundaries (paragraph, line, word), matched in one linear pass
+_SEP_RE = re.compile(r"\n\n|\n| ")
+
+def split_text(text: str, target: int) -> List[str]:
+    """Cut text into separator-terminated pieces in a single regex pass.
+
+    Each piece keeps the separator that ends it, so joining the pieces gives back
+    the original text. Runs longer than target are hard-split.
+    """
+    pieces = []
+    start = 0
+    for match in _SEP_RE.finditer(text):
+        pieces.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        pieces.append(text[start:])
+
+    if all(len(piece) <= target for piece in pieces):
+        return pieces
+    return [piece[i:i + target] for piece in pieces for i in range(0, len(piece), target)]
+
+def _cut_index(window: List[str], target: int) -> int:
+    """Roll back to the last line/paragraph break in the second half of the window"""
+    size = 0
+    cut = len(window)
+    for i, piece in enumerate(window):
+        size += len(piece)
+        if size >= target // 2 and piece.endswith("\n"):
+            cut = i + 1
+    return cut
+
+def _overlap_tail(pieces: List[str], overlap: int) -> List[str]:
+    """Trailing pieces of an emitted chunk totalling at most overlap chars"""
+    tail = []
+    size = 0
+    for piece in reversed(pieces):
+        if size + len(piece) > overlap:
+            break
+        tail.append(piece)
+        size += len(piece)
+    tail.reverse()
+    return tail
+
+def split_then_merge(docs: List[Document], target: int = 1000, min_size: int = 100,
+                     max_size: int = 1150, overlap: int = 200) -> List[Document]:
+    """Split-then-Merge chunking in one linear pass per document.
+
+    Pieces from split_text are greedily packed up to target chars. A chunk still
+    under min_size may grow to max_size, so tiny fragments are avoided. Full
+    chunks roll back to their last line break so they end on natural boundaries.
+    Each new chunk starts with up to overlap chars of the previous one, aligned
+    to a separator.
+    """
+    chunks = []
+    for doc in docs:
+        window = []
+        size = 0
+        for piece in split_text(doc.page_content, target):
+            while window and size + len(piece) > (max_size if size < min_size else target):
+                cut = _cut_index(window, target)
+                emitted, carry = window[:cut], window[cut:]
+                content = "".join(emitted).strip()
+                if content:
+                    chunks.append(Document(page_content=content, metadata=dict(doc.metadata)))
+
+                carry_size = sum(len(p) for p in carry)
+                tail = _overlap_tail(emitted, overlap)
+                tail_size = sum(len(p) for p in tail)
+                if carry_size + tail_size + len(piece) > target:
+                    tail, tail_size = [], 0
+                window = tail + carry
+                size = tail_size + carry_size
+                if not carry:
+                    break
+            window.append(piece)
+            size += len(piece)
+
+        content = "".join(window).strip()
+        if content:
+            chunks.append(Document(page_content=content, metadata=dict(doc.metadata)))
+    return chunks
+
 def process_pdfs(pdf_filepaths: List[str]):
     """Process PDF files and create vector embeddings"""
-    global vectorstore
-
     if not embedding:
         raise HTTPException(status_code=500, detail="Embedding model not available")
 
     all_docs = []
 
-    for pdf_file in pdf_filepaths:
-        try:
-            loader = PyPDFLoader(pdf_file)
-            documents = loader.load()
-            all_docs.extend(documents)
-            print(f"✅ Loaded {len(documents)} pages from {pdf_file}")
-        except Exception as e:
-            print(f"❌ Error loading {pdf_file}: {str(e)}")
-            continue
+    # PDF parsing is CPU-bound, so load several files in parallel worker processes,
+    # sized to the batch; a single file is not worth spawning a pool for. Workers are
+    # spawned (never forked from this threaded process) and only import pdf_loader,
+    # so they don't reload the embedding model or rebuild the app
+    pool_size = min(len(pdf_filepaths), os.cpu_count() or 1)
+    if pool_size > 1:
+        with ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context("spawn")) as executor:
+            loaded = list(executor.map(load_pdf, pdf_filepaths))
+    else:
+        loaded = [load_pdf(pdf_file) for pdf_file in pdf_filepaths]
+    for documents in loaded:
+        all_docs.extend(documents)
 
     if not all_docs:
         raise HTTPException(status_code=400, detail="No documents could be processed")
 
     # Split documents into chunks
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", " ", ""]
-    )
-
-    docs_chunks = text_splitter.split_documents(all_docs)
+    docs_chunks = split_then_merge(all_docs)
     print(f"📄 Created {len(docs_chunks)} document chunks")
 
     # Create or update vectorstore
     try:
-        if os.path.exists(CHROMA_PERSIST_DIR) and os.listdir(CHROMA_PERSIST_DIR):
-            # Load existing vectorstore and add new documents
-            vectorstore = Chroma(persist_directory=CHROMA_PERSIST_DIR, embedding_function=embedding)
-            vectorstore.add_documents(docs_chunks)
-        else:
-            # Create new vectorstore
-            vectorstore = Chroma.from_documents(
-                docs_chunks,
-                embedding,
-                persist_directory=CHROMA_PERSIST_DIR
+        with ingest_lock:
+            # Add to a private copy of the index, save it, then serve that same copy
+            store = read_store()
+            if store is None:
+                store = new_store()
+            add_chunks(
+                store,
+                [chunk.page_content for chunk in docs_chunks],
+                [chunk.metadata for chunk in docs_chunks]
             )
-
-        vectorstore.persist()
+            save_store(store)
+            set_vectorstore(store)
         print("✅ Vector database updated successfully")
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating vector database: {str(e)}")
 
+async def server_loop(model_queue: asyncio.Queue):
+    """Serve queued prompts one at a time so generations never overlap on the model.
+
+    Tokens are pushed onto each request's response queue as they are generated,
+    followed by None once the answer is complete. A request whose caller has gone
+    away sets its cancelled event, and its generation is skipped or cut short.
+    """
+    client = ollama.AsyncClient()
+    while True:
+        prompt, response_q, cancelled = await model_queue.get()
+        try:
+            if cancelled.is_set():
+                continue
+            stream = await client.chat(
+                model=LLM_MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    if cancelled.is_set():
+                        break
+                    await response_q.put(chunk['message']['content'])
+            finally:
+                # Closing the stream ends the Ollama request instead of draining it
+                await stream.aclose()
+            await response_q.put(None)
+        except Exception as e:
+            # Hand the error back to the waiting request instead of killing the worker
+            await response_q.put(e)
+        finally:
+            model_queue.task_done()
+
+@app.on_event("startup")
+def load_stores():
+    """Open the persisted vectorstore once so queries reuse a single retriever"""
+    if not embedding:
+        return
+    try:
+        store = read_store()
+        if store is None:
+            # Indexes from before the switch to FAISS are rebuilt from the uploaded PDFs
+            pdf_files = [os.path.join(UPLOAD_DIR, name) for name in sorted(os.listdir(UPLOAD_DIR))
+                         if name.lower().endswith('.pdf')]
+            if pdf_files:
+                print(f"🔁 Rebuilding FAISS index from {len(pdf_files)} uploaded PDFs")
+                process_pdfs(pdf_files)
+            return
+
+        # Stores built with another embedding model hold vectors of another dimension
+        built_with = None
+        if os.path.exists(EMBEDDING_MARKER):
+            with open(EMBEDDING_MARKER) as marker:
+                built_with = marker.read().strip()
+        if built_with != EMBEDDING_MODEL_NAME:
+            store = reembed_store(store)
+
+        set_vectorstore(store)
+        print("📚 Loaded existing vectorstore")
+    except Exception as e:
+        print(f"❌ Error loading vectorstore: {e}")
+
+@app.on_event("startup")
+async def start_model_worker():
+    """Start the single background worker that owns all LLM requests"""
+    app.state.model_queue = asyncio.Queue()
+    app.state.model_worker = asyncio.create_task(server_loop(app.state.model_queue))
+
+@app.on_event("shutdown")
+async def stop_model_worker():
+    """Cancel the LLM worker on shutdown"""
+    app.state.model_worker.cancel()
+
 @app.get("/")
 def read_root():
     return {
@@ -149,6 +467,12 @@ def health_check():
             "vectorstore_ready": vectorstore is not None
         }
 
+def remove_uploads(paths: List[str]):
+    """Delete the saved files of a failed upload request"""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
 @app.post("/upload_pdfs")
 async def upload_pdfs(files: List[UploadFile] = File(...)):
     """Upload and process HR policy PDF files"""
@@ -157,24 +481,48 @@ async def upload_pdfs(files: List[UploadFile] = File(...)):
 
     uploaded_paths = []
 
+    # Every rejection removes the files already saved by this request; left behind,
+    # they would be indexed by the startup rebuild on the next restart
     for file in files:
         if not file.filename.lower().endswith('.pdf'):
+            remove_uploads(uploaded_paths)
             raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
 
         file_path = os.path.join(UPLOAD_DIR, file.filename)
 
         try:
+            # Validate the PDF magic bytes before touching the disk
+            chunk = await file.read(UPLOAD_CHUNK_BYTES)
+            if not chunk.startswith(b"%PDF"):
+                raise HTTPException(status_code=415, detail=f"File {file.filename} is not a valid PDF")
+
+            total = 0
             with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+                while chunk:
+                    total += len(chunk)
+                    if total > MAX_PDF_BYTES:
+                        break
+                    buffer.write(chunk)
+                    chunk = await file.read(UPLOAD_CHUNK_BYTES)
+
+            if total > MAX_PDF_BYTES:
+                # Drop the partially written file of an oversized upload
+                os.remove(file_path)
+                raise HTTPException(status_code=413, detail=f"File {file.filename} exceeds the {MAX_PDF_BYTES} byte limit")
+
             uploaded_paths.append(file_path)
             print(f"📤 Uploaded: {file.filename}")
 
+        except HTTPException:
+            remove_uploads(uploaded_paths)
+            raise
         except Exception as e:
+            remove_uploads(uploaded_paths)
             raise HTTPException(status_code=500, detail=f"Error saving {file.filename}: {str(e)}")
 
-    # Process the uploaded PDFs
+    # Process the uploaded PDFs off the event loop, so queries and streams keep running
     try:
-        process_pdfs(uploaded_paths)
+        await asyncio.to_thread(process_pdfs, uploaded_paths)
         return {
             "message": f"Successfully processed {len(uploaded_paths)} HR policy PDF files",
             "files": [os.path.basename(path) for path in uploaded_paths]
@@ -182,41 +530,73 @@ async def upload_pdfs(files: List[UploadFile] = File(...)):
 
     except Exception as e:
         # Clean up uploaded files if processing fails
-        for path in uploaded_paths:
-            if os.path.exists(path):
-                os.remove(path)
+        remove_uploads(uploaded_paths)
         raise HTTPException(status_code=500, detail=f"Error processing PDFs: {str(e)}")
 
-@app.post("/query", response_model=QueryResponse)
-def query_pdf(request: QueryRequest):
-    """Query the HR policy documents"""
-    global vectorstore
+async def generate_tokens(prompt: str):
+    """Queue a prompt for the model worker and yield its answer token by token"""
+    response_q = asyncio.Queue()
+    cancelled = asyncio.Event()
+    await app.state.model_queue.put((prompt, response_q, cancelled))
+    try:
+        while True:
+            token = await response_q.get()
+            if token is None:
+                return
+            if isinstance(token, Exception):
+                raise token
+            yield token
+    finally:
+        # Runs on disconnect (GeneratorExit / CancelledError) too, freeing the model slot
+        cancelled.set()
+
+def question_key(question: str) -> bytes:
+    """Cache key for a question, ignoring case and surrounding whitespace"""
+    return hashlib.blake2b(question.strip().lower().encode(), digest_size=16).digest()
+
+def sse_event(data, event: str = None) -> str:
+    """Format one Server-Sent Event with a JSON-encoded payload"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post(
+    "/query",
+    response_model=QueryResponse,
+    responses={200: {"content": {"text/event-stream": {}}}}
+)
+async def query_pdf(request: QueryRequest, raw_request: Request):
+    """Query the HR policy documents.
 
-    if vectorstore is None:
-        # Try to load existing vectorstore
-        if os.path.exists(CHROMA_PERSIST_DIR) and os.listdir(CHROMA_PERSIST_DIR):
-            try:
-                vectorstore = Chroma(persist_directory=CHROMA_PERSIST_DIR, embedding_function=embedding)
-                print("📚 Loaded existing vectorstore")
-            except Exception as e:
-                print(f"❌ Error loading vectorstore: {e}")
-                raise HTTPException(status_code=400, detail="No documents loaded. Please upload HR policy PDFs first.")
-        else:
-            raise HTTPException(status_code=400, detail="No documents loaded. Please upload HR policy PDFs first.")
+    Clients sending `Accept: text/event-stream` receive the answer as SSE token
+    events followed by a `sources` event; all others get a QueryResponse.
+    """
+    current_retriever, generation = current_retriever_and_generation()
+    if current_retriever is None:
+        raise HTTPException(status_code=400, detail="No documents loaded. Please upload HR policy PDFs first.")
 
     if not request.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
+    wants_stream = "text/event-stream" in raw_request.headers.get("accept", "")
+
+    # Repeated questions are answered from the cache without retrieval or generation
+    cache_key = question_key(request.question)
+    cached = get_cached_answer(cache_key)
+    if cached is not None:
+        print(f"⚡ Cache hit for: {request.question[:50]}...")
+        if wants_stream:
+            async def cached_stream():
+                yield sse_event(cached.answer)
+                yield sse_event(cached.sources, event="sources")
+            return StreamingResponse(cached_stream(), media_type="text/event-stream")
+        return cached
+
     try:
         print(f"🔍 Processing query: {request.question}")
 
-        # Retrieve relevant chunks using vectorstore
-        retriever = vectorstore.as_retriever(
-            search_type="similarity",
-            search_kwargs={"k": 3}
-        )
-
-        relevant_docs = retriever.get_relevant_documents(request.question)
+        # Retrieve relevant chunks using the cached retriever (off the event loop,
+        # since it embeds the question synchronously)
+        relevant_docs = await asyncio.to_thread(current_retriever.get_relevant_documents, request.question)
 
         if not relevant_docs:
             return QueryResponse(
@@ -224,34 +604,45 @@ def query_pdf(request: QueryRequest):
                 sources=[]
             )
 
-        # Prepare context from retrieved documents
-        context = "\n\n".join([doc.page_content for doc in relevant_docs])
-        sources = [f"Page {doc.metadata.get('page', 'Unknown')} from {os.path.basename(doc.metadata.get('source', 'Unknown'))}"
-                  for doc in relevant_docs]
+        # Prepare context and sources from retrieved documents in a single pass
+        buf = io.StringIO()
+        sources = []
+        for i, doc in enumerate(relevant_docs):
+            if i:
+                buf.write("\n\n")
+            buf.write(doc.page_content)
+            sources.append(f"Page {doc.metadata.get('page', 'Unknown')} from {os.path.basename(doc.metadata.get('source', 'Unknown'))}")
+        context = buf.getvalue()
 
         # Format prompt for the LLM
-        prompt = f"""You are an HR Policy Assistant. Based on the following HR policy documents, please answer the question clearly and professionally.
-
-Context from HR Policy Documents:
-{context}
-
-Question: {request.question}
-
-Please provide a comprehensive answer based only on the information provided in the HR policy documents above. If the documents don't contain enough information to fully answer the question, please say so and suggest what additional information might be needed.
-
-Answer:"""
-
-        # Get completion from Ollama chat model locally
+        prompt = f"{_PROMPT_PREFIX}{context}{_PROMPT_MID}{request.question}{_PROMPT_SUF}"
+
+        # Stream the completion from the Ollama chat model as it is generated
+        if wants_stream:
+            async def token_stream():
+                try:
+                    tokens = []
+                    async for token in generate_tokens(prompt):
+                        tokens.append(token)
+                        yield sse_event(token)
+                    cache_answer(cache_key, generation, QueryResponse(answer="".join(tokens), sources=sources))
+                    print(f"✅ Generated answer for: {request.question[:50]}...")
+                except Exception as ollama_error:
+                    print(f"❌ Ollama error: {ollama_error}")
+                    yield sse_event(f"Based on the HR policy documents, I found relevant information but encountered an issue generating the response. Please try again. Error: {str(ollama_error)}")
+                yield sse_event(sources, event="sources")
+
+            return StreamingResponse(token_stream(), media_type="text/event-stream")
+
+        # Get completion from Ollama chat model locally via the model worker queue
         try:
-            response = ollama.chat(
-                model=LLM_MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}]
-            )
-            answer = response['message']['content']
+            answer = "".join([token async for token in generate_tokens(prompt)])
 
             print(f"✅ Generated answer for: {request.question[:50]}...")
 
-            return QueryResponse(answer=answer, sources=sources)
+            response = QueryResponse(answer=answer, sources=sources)
+            cache_answer(cache_key, generation, response)
+            return response
 
         except Exception as ollama_error:
             print(f"❌ Ollama error: {ollama_error}")
@@ -268,17 +659,15 @@ Answer:"""
 @app.delete("/clear_database")
 def clear_database():
     """Clear the vector database and uploaded files"""
-    global vectorstore
-
     try:
-        # Clear vectorstore
-        if vectorstore:
-            vectorstore = None
+        with ingest_lock:
+            # Clear vectorstore and cached retriever
+            set_vectorstore(None)
 
-        # Remove database directory
-        if os.path.exists(CHROMA_PERSIST_DIR):
-            shutil.rmtree(CHROMA_PERSIST_DIR)
-        os.makedirs(CHROMA_PERSIST_DIR, exist_ok=True)
+            # Remove database directory
+            if os.path.exists(FAISS_PERSIST_DIR):
+                shutil.rmtree(FAISS_PERSIST_DIR)
+            os.makedirs(FAISS_PERSIST_DIR, exist_ok=True)
 
         # Clear uploaded files
         if os.path.exists(UPLOAD_DIR):
@@ -297,19 +686,25 @@ def test_endpoint():
     """Simple test endpoint to verify API is working"""
     return {
         "message": "HR Policy RAG API is working!",
-        "timestamp": os.popen('date').read().strip(),
+        "timestamp": datetime.now().isoformat(),
         "status": "ok"
     }
 
 if __name__ == "__main__":
     import uvicorn
     print("🚀 Starting HR Policy RAG API on port 8001...")
+    print(f"🧠 LLM model: {LLM_MODEL_NAME} (run 'ollama pull {LLM_MODEL_NAME}' if it is missing)")
     print("📚 Make sure to upload HR policy PDFs using POST /upload_pdfs before querying")
     print("🔍 Use POST /query to ask questions about HR policies")
 
+    # Multiple workers need an import string (see WORKERS for why the default is one);
+    # a single worker serves this app object, so the module (and the embedding model)
+    # is not imported a second time
     uvicorn.run(
-        app, 
-        host="0.0.0.0", 
+        app if WORKERS == 1 else "RAG_api_fixed:app",
+        host="0.0.0.0",
         port=8001,  # Changed to port 8001 to avoid conflict with timesheet API
-        log_level="info"
+        log_level="info",
+        workers=WORKERS,
+        reload=False
     )
@@ -11,13 +11,18 @@ UPDATED FEATURES:
 """
 
 import os
+import re
+import asyncio
 import json
 import logging
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
 from pydantic import BaseModel, Field
 import pandas as pd
 import requests
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -63,18 +68,43 @@ class TimesheetEntry(BaseModel):
     system: str = "Oracle"  # Oracle or Mars
 
 # Global storage (in production, use proper database)
-user_sessions = {}
-timesheet_data = {}
+# Sessions live in process memory, so only run more than one worker once they
+# move to a shared store (e.g. Redis); otherwise requests land on different sessions
+WORKERS = int(os.getenv("WORKERS", "1"))
+SESSION_TTL_SECONDS = 3600  # Sessions idle longer than this are evicted
+SESSION_EVICT_INTERVAL = 60  # Seconds between eviction sweeps
+# TTLCache is not thread-safe: only touch it from async handlers/tasks on the event
+# loop, never from sync endpoints (FastAPI runs those in a threadpool)
+user_sessions = TTLCache(maxsize=10000, ttl=SESSION_TTL_SECONDS)
+
+# Timesheet entries for all users in one columnar frame, one row per entry
+TIMESHEET_COLUMNS = ["email", "date", "project", "hours", "comments", "system"]
+timesheet_df = pd.DataFrame(columns=TIMESHEET_COLUMNS).astype({"hours": float})
+
+# Intent keywords matched in a single pass over the prompt
+_INTENT_RE = re.compile(
+    r"\b(fill|add|enter|submit|view|show|display|see|help|how|what|clear|delete|remove|oracle|mars)\b",
+    re.I
+)
+_SYSTEM_MAP = {"oracle": "Oracle", "mars": "Mars"}
+_ACTION_MAP = {
+    "fill": "fill_timesheet", "add": "fill_timesheet", "enter": "fill_timesheet", "submit": "fill_timesheet",
+    "view": "view_timesheet", "show": "view_timesheet", "display": "view_timesheet", "see": "view_timesheet",
+    "help": "help", "how": "help", "what": "help",
+    "clear": "clear", "delete": "clear", "remove": "clear"
+}
+# When a prompt hits several actions, the first one listed here wins
+_ACTION_PRIORITY = ["fill_timesheet", "view_timesheet", "help", "clear"]
+
+@lru_cache(maxsize=8)
+def _week_for(day: date):
+    """Dates (Monday to Sunday) of the week containing day, as an immutable tuple"""
+    monday = day - timedelta(days=day.weekday())
+    return tuple((monday + timedelta(days=i)).isoformat() for i in range(7))
 
 def get_current_week_dates():
     """Get current week's dates (Monday to Sunday)"""
-    today = datetime.now()
-    monday = today - timedelta(days=today.weekday())
-    week_dates = []
-    for i in range(7):
-        date = monday + timedelta(days=i)
-        week_dates.append(date.strftime("%Y-%m-%d"))
-    return week_dates
+    return _week_for(datetime.now().date())
 
 def initialize_user_session(email: str):
     """Initialize user session with default data"""
@@ -83,14 +113,10 @@ def initialize_user_session(email: str):
             "current_week": get_current_week_dates(),
             "selected_system": None,
             "draft_entries": [],
-            "conversation_context": [],
+            "conversation_context": deque(maxlen=20),  # Last 10 conversation turns
             "last_activity": datetime.now().isoformat()
         }
 
-        # Initialize empty timesheet for current week
-        if email not in timesheet_data:
-            timesheet_data[email] = {}
-
     return user_sessions[email]
 
 def parse_user_intent(user_prompt: str) -> Dict[str, Any]:
@@ -104,28 +130,26 @@ def parse_user_intent(user_prompt: str) -> Dict[str, Any]:
         "comments": None
     }
 
-    prompt_lower = user_prompt.lower()
+    hits = {word.lower() for word in _INTENT_RE.findall(user_prompt)}
 
     # Detect system
-    if "oracle" in prompt_lower:
-        intent["system"] = "Oracle"
-    elif "mars" in prompt_lower:
-        intent["system"] = "Mars"
+    for keyword, system in _SYSTEM_MAP.items():
+        if keyword in hits:
+            intent["system"] = system
+            break
 
     # Detect actions
-    if any(word in prompt_lower for word in ["fill", "add", "enter", "submit"]):
-        intent["action"] = "fill_timesheet"
-    elif any(word in prompt_lower for word in ["view", "show", "display", "see"]):
-        intent["action"] = "view_timesheet"
-    elif any(word in prompt_lower for word in ["help", "how", "what"]):
-        intent["action"] = "help"
-    elif any(word in prompt_lower for word in ["clear", "delete", "remove"]):
-        intent["action"] = "clear"
+    actions = {_ACTION_MAP[word] for word in hits if word in _ACTION_MAP}
+    for action in _ACTION_PRIORITY:
+        if action in actions:
+            intent["action"] = action
+            break
 
     return intent
 
 def generate_timesheet_response(email: str, intent: Dict[str, Any], user_prompt: str) -> str:
     """Generate appropriate response based on user intent"""
+    global timesheet_df
     session = user_sessions[email]
 
     if intent["action"] == "help":
@@ -145,8 +169,8 @@ I can help you with:
 What would you like to do with your timesheet?"""
 
     elif intent["action"] == "view_timesheet":
-        current_entries = timesheet_data.get(email, {})
-        if not current_entries:
+        current_entries = timesheet_df[timesheet_df.email == email]
+        if current_entries.empty:
             return """📋 **Your Timesheet is Empty**
 
 No timesheet entries found. Would you like to:
@@ -157,19 +181,21 @@ Just let me know what you'd like to do!"""
 
         # Format timesheet display
         response = f"📊 **Your Current Timesheet**\n\n"
-        total_hours = 0
-
-        for date, entries in current_entries.items():
-            if isinstance(entries, list) and entries:
-                response += f"**{date}:**\n"
-                for entry in entries:
-                    hours = entry.get('hours', 0)
-                    total_hours += hours
-                    response += f"  • {entry.get('project', 'Unknown')} - {hours}h - {entry.get('system', 'Oracle')}\n"
-                    response += f"    Comment: {entry.get('comments', 'No comment')}\n"
-                response += "\n"
-
-        response += f"**Total Hours This Week:** {total_hours}h"
+        # Same fallbacks for missing fields as the old per-entry dict lookups
+        current_entries = current_entries.fillna(
+            {"project": "Unknown", "hours": 0, "system": "Oracle", "comments": "No comment"}
+        )
+        total_hours = current_entries.hours.sum()
+
+        # :g prints whole hours the way they were entered (8h, not 8.0h)
+        for entry_date, entries in current_entries.groupby("date", sort=False):
+            response += f"**{entry_date}:**\n"
+            for entry in entries.itertuples(index=False):
+                response += f"  • {entry.project} - {entry.hours:g}h - {entry.system}\n"
+                response += f"    Comment: {entry.comments}\n"
+            response += "\n"
+
+        response += f"**Total Hours This Week:** {total_hours:g}h"
         return response
 
     elif intent["action"] == "fill_timesheet":
@@ -200,8 +226,7 @@ Please provide your timesheet entries. You can tell me:
 What's your first entry?"""
 
     elif intent["action"] == "clear":
-        if email in timesheet_data:
-            timesheet_data[email] = {}
+        timesheet_df = timesheet_df[timesheet_df.email != email]
         session["draft_entries"] = []
         return """🧹 **Timesheet Cleared**
 
@@ -243,6 +268,27 @@ What would you like to do? Please be more specific, for example:
 - "Show my timesheet"
 - "Help with timesheet commands" """
 
+async def evict_loop():
+    """Periodically drop expired sessions and the timesheet rows of evicted users"""
+    global timesheet_df
+    while True:
+        await asyncio.sleep(SESSION_EVICT_INTERVAL)
+        user_sessions.expire()
+        active = timesheet_df.email.isin(list(user_sessions.keys()))
+        if not active.all():
+            timesheet_df = timesheet_df[active]
+            logger.info(f"Dropped timesheet entries of expired sessions, {len(user_sessions)} sessions active")
+
+@app.on_event("startup")
+async def start_eviction():
+    """Start the background session eviction task"""
+    app.state.evict_task = asyncio.create_task(evict_loop())
+
+@app.on_event("shutdown")
+async def stop_eviction():
+    """Cancel the session eviction task on shutdown"""
+    app.state.evict_task.cancel()
+
 @app.get("/")
 def root():
     """API root endpoint with information"""
@@ -264,13 +310,13 @@ def root():
     }
 
 @app.get("/health")
-def health_check():
+async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "active_sessions": len(user_sessions),
-        "total_users": len(timesheet_data)
+        "total_users": int(timesheet_df.email.nunique())  # Distinct users with timesheet entries
     }
 
 @app.post("/chat", response_model=ChatResponse)
@@ -282,8 +328,9 @@ async def chat_endpoint(request: ChatRequest):
         # Initialize user session
         session = initialize_user_session(request.email)
 
-        # Update last activity
+        # Update last activity (re-assigning restarts the session's TTL)
         session["last_activity"] = datetime.now().isoformat()
+        user_sessions[request.email] = session
 
         # Add to conversation context
         session["conversation_context"].append({
@@ -305,10 +352,6 @@ async def chat_endpoint(request: ChatRequest):
             "intent": intent
         })
 
-        # Keep only last 10 conversation turns
-        if len(session["conversation_context"]) > 20:
-            session["conversation_context"] = session["conversation_context"][-20:]
-
         logger.info(f"Generated response for {request.email}")
 
         return ChatResponse(
@@ -329,24 +372,27 @@ async def chat_endpoint(request: ChatRequest):
         )
 
 @app.get("/user/{email}/session")
-def get_user_session(email: str):
+async def get_user_session(email: str):
     """Get user session information (for debugging)"""
     if email not in user_sessions:
         raise HTTPException(status_code=404, detail="User session not found")
 
     return {
         "email": email,
-        "session": user_sessions[email],
-        "timesheet_entries": len(timesheet_data.get(email, {}))
+        "session": {
+            **user_sessions[email],
+            "conversation_context": list(user_sessions[email]["conversation_context"])
+        },
+        "timesheet_entries": int((timesheet_df.email == email).sum())
     }
 
 @app.delete("/user/{email}/session")
-def clear_user_session(email: str):
+async def clear_user_session(email: str):
     """Clear user session and data"""
+    global timesheet_df
     if email in user_sessions:
         del user_sessions[email]
-    if email in timesheet_data:
-        del timesheet_data[email]
+    timesheet_df = timesheet_df[timesheet_df.email != email]
 
     return {"message": f"Session cleared for {email}"}
 
@@ -366,10 +412,13 @@ if __name__ == "__main__":
     print("🌐 CORS enabled for web frontend integration")
     print("📝 Use POST /chat to interact with the timesheet assistant")
 
+    # Multiple workers need an import string; a single worker serves this app object
+    # instead of importing the module a second time
     uvicorn.run(
-        app,
+        app if WORKERS == 1 else "TimeSheet_api_fixed:app",
         host="0.0.0.0",
         port=8000,
         log_level="info",
-        reload=True  # Enable auto-reload during development
+        workers=WORKERS,
+        reload=False
     )
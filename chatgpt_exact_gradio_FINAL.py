@@ -6,46 +6,91 @@
 """
 
 import gradio as gr
-import requests
+import aiohttp
 import json
+import re
 import asyncio
 import time
+from collections import deque
+from functools import lru_cache
 from datetime import datetime
 from typing import Optional, Tuple, List, Dict, Any
+from dataclasses import dataclass
+from types import MappingProxyType
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 🎯 API Configuration - Perfectly Aligned
-API_CONFIG = {
-    "timesheet": {
-        "base_url": "http://localhost:8000",
-        "endpoint": "/chat",
-        "method": "POST",
-        "name": "Timesheet Management",
-        "description": "Manage your Oracle and Mars timesheets with AI assistance",
-        "icon": "⏰",
-        "color": "#0066cc"
-    },
-    "hr_policy": {
-        "base_url": "http://localhost:8001", 
-        "endpoint": "/query",
-        "method": "POST",
-        "name": "HR Policy Assistant",
-        "description": "Get answers about company policies and HR documents", 
-        "icon": "📋",
-        "color": "#7c3aed"
-    }
-}
+@dataclass(frozen=True, slots=True)
+class ServiceCfg:
+    """Connection and display settings for one backend service"""
+    base_url: str
+    endpoint: str
+    method: str
+    name: str
+    description: str
+    icon: str
+    color: str
+
+# 🎯 API Configuration - Perfectly Aligned (read-only; shared by every session)
+API_CONFIG = MappingProxyType({
+    "timesheet": ServiceCfg(
+        base_url="http://localhost:8000",
+        endpoint="/chat",
+        method="POST",
+        name="Timesheet Management",
+        description="Manage your Oracle and Mars timesheets with AI assistance",
+        icon="⏰",
+        color="#0066cc"
+    ),
+    "hr_policy": ServiceCfg(
+        base_url="http://localhost:8001",
+        endpoint="/query",
+        method="POST",
+        name="HR Policy Assistant",
+        description="Get answers about company policies and HR documents",
+        icon="📋",
+        color="#7c3aed"
+    )
+})
+
+# Email format, compiled once at import. Domain labels cannot contain dots, so the
+# classes on either side of each boundary never overlap and matching stays linear
+_EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+\-]{1,64}@[A-Za-z0-9](?:[A-Za-z0-9\-]{0,63}\.)+[A-Za-z]{2,24}$')
+
+# Shared keep-alive connection pool for all chat sessions, created on first use
+HTTP_SESSION: Optional[aiohttp.ClientSession] = None
+HTTP_SESSION_LOOP: Optional[asyncio.AbstractEventLoop] = None  # Loop that owns the session
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Return the pooled HTTP session, creating it inside the running event loop"""
+    global HTTP_SESSION, HTTP_SESSION_LOOP
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+        )
+        HTTP_SESSION_LOOP = asyncio.get_running_loop()
+    return HTTP_SESSION
+
+async def close_http_session():
+    """Close the pooled HTTP session on server shutdown"""
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+
+# Shortest time the typing indicator stays visible, so instant replies don't flash
+MIN_TYPING_SECONDS = 0.2
+
+# Messages kept per session; older ones drop off so each re-render stays bounded
+MAX_HISTORY = 100
 
 class ChatState:
     """Enhanced chat state management exactly like ChatGPT"""
     def __init__(self):
         self.selected_service = None
         self.user_email = ""
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=MAX_HISTORY)
         self.is_service_selected = False
         self.session_start = datetime.now()
         self.message_count = 0
@@ -54,98 +99,129 @@ class ChatState:
         """Reset state for fresh conversation"""
         self.selected_service = None
         self.user_email = ""
-        self.conversation_history = []
+        self.conversation_history = deque(maxlen=MAX_HISTORY)
         self.is_service_selected = False
         self.session_start = datetime.now()
         self.message_count = 0
 
 def validate_email(email: str) -> bool:
     """Professional email validation"""
-    import re
-    if not email:
+    # Cheap structural pre-filter before the strict regex
+    if not email or len(email) > 254 or email.count('@') != 1:
         return False
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return _EMAIL_RE.match(email) is not None
+
+# Shown when a backend answers 200 without any message field
+_DEFAULT_MSG = "Response received successfully."
+
+def _parse_ts(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a Timesheet API response for the chat"""
+    try:
+        message = data["response"]
+    except KeyError:
+        message = data.get("message", _DEFAULT_MSG)
+    return {
+        "success": True,
+        "message": message,
+        "data": data.get("data", {})
+    }
+
+def _parse_hr(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an HR Policy API response for the chat, appending its sources"""
+    try:
+        answer = data["answer"]
+    except KeyError:
+        answer = data.get("response", data.get("message", _DEFAULT_MSG))
+    sources = data.get("sources", [])
+    if sources:
+        answer = f"{answer}\n\n📚 **Sources:** {', '.join(map(str, sources))}"
+    return {
+        "success": True,
+        "message": answer,
+        "data": {"sources": sources}
+    }
+
+# Per-service request bodies and response parsers, keyed like API_CONFIG
+_PAYLOAD_BUILDERS = {
+    "timesheet": lambda message, email: {"email": email, "user_prompt": message},
+    "hr_policy": lambda message, email: {"question": message},
+}
+_RESPONSE_PARSERS = {
+    "timesheet": _parse_ts,
+    "hr_policy": _parse_hr,
+}
+
+# Prebuilt failure results, so a flapping backend costs no formatting per call
+_TIMEOUT_RESULT = {
+    "success": False,
+    "message": "⏱️ The service took too long to respond. Please try again in a moment.",
+    "data": {}
+}
+_CONN_RESULT = {
+    service: {
+        "success": False,
+        "message": f"🔌 Cannot connect to {config.name} service. Please ensure the API server is running on {config.base_url}.",
+        "data": {}
+    }
+    for service, config in API_CONFIG.items()
+}
 
 async def call_api(service: str, message: str, email: str = None) -> Dict[str, Any]:
     """Enhanced API calling with proper error handling"""
     try:
         config = API_CONFIG[service]
-        url = f"{config['base_url']}{config['endpoint']}"
+        url = f"{config.base_url}{config.endpoint}"
 
         # Prepare payload based on service type
-        if service == "timesheet":
-            payload = {
-                "email": email,
-                "user_prompt": message
-            }
-        else:  # hr_policy
-            payload = {
-                "question": message
-            }
+        payload = _PAYLOAD_BUILDERS[service](message, email)
 
-        logger.info(f"Calling {service} API: {url}")
+        logger.info("Calling %s API: %s", service, url)
 
-        response = requests.post(
+        session = await get_http_session()
+        async with session.post(
             url,
             json=payload,
             headers={
                 "Content-Type": "application/json",
                 "Accept": "application/json"
             },
-            timeout=30
-        )
+            timeout=aiohttp.ClientTimeout(total=30)
+        ) as response:
+            status = response.status
+            data = await response.json() if status == 200 else None
 
-        if response.status_code == 200:
-            data = response.json()
-            logger.info(f"✅ {service} API responded successfully")
+        if status == 200:
+            logger.info("✅ %s API responded successfully", service)
 
             # Handle different response formats
-            if service == "timesheet":
-                return {
-                    "success": True,
-                    "message": data.get("response", data.get("message", "Response received successfully.")),
-                    "data": data.get("data", {})
-                }
-            else:  # hr_policy
-                answer = data.get("answer", data.get("response", data.get("message", "Response received successfully.")))
-                sources = data.get("sources", [])
-                if sources:
-                    answer += f"\n\n📚 **Sources:** {', '.join(sources)}"
-                return {
-                    "success": True,
-                    "message": answer,
-                    "data": {"sources": sources}
-                }
+            return _RESPONSE_PARSERS[service](data)
         else:
-            logger.error(f"❌ API Error: {response.status_code}")
+            logger.error("❌ API Error: %s", status)
             return {
                 "success": False,
-                "message": f"API Error ({response.status_code}): Please check if the service is running.",
+                "message": f"API Error ({status}): Please check if the service is running.",
                 "data": {}
             }
 
-    except requests.exceptions.ConnectionError:
-        logger.error(f"❌ Connection error to {service} API")
-        return {
-            "success": False,
-            "message": f"🔌 Cannot connect to {config['name']} service. Please ensure the API server is running on {config['base_url']}.",
-            "data": {}
-        }
+    except asyncio.TimeoutError:
+        logger.error("⏱️ Timeout calling %s API", service)
+        return _TIMEOUT_RESULT
+    except aiohttp.ClientConnectorError:
+        logger.error("❌ Connection error to %s API", service)
+        return _CONN_RESULT[service]
     except Exception as e:
-        logger.error(f"❌ Unexpected error: {str(e)}")
+        logger.exception("❌ Unexpected error: %s", e)
         return {
             "success": False,
             "message": f"❌ An unexpected error occurred: {str(e)}",
             "data": {}
         }
 
-def create_welcome_message_with_options(email: str = None) -> str:
-    """Create ChatGPT-style welcome message with clickable service options IN the chat - ALL SYNTAX FIXED"""
+# Escapes for text interpolated into chat HTML, applied in one C-level translate pass
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
 
-    email_section = ""
-    if not email:
-        email_section = """
+# 🧱 Static welcome HTML, built once at import; only the email banner varies per call
+_EMAIL_REQUIRED_HTML = """
         <div style="background: #f7f7f8; border: 1px solid #d1d5db; border-radius: 12px; padding: 16px; margin: 16px 0;">
             <div style="display: flex; align-items: center; gap: 8px; margin-bottom: 12px;">
                 <span style="font-size: 20px;">📧</span>
@@ -157,19 +233,18 @@ def create_welcome_message_with_options(email: str = None) -> str:
         </div>
         """
 
-    email_display = ""
-    if email:
-        email_display = f"""
+_EMAIL_DISPLAY_TEMPLATE = """
         <div style="background: #e0f2fe; border: 1px solid #0288d1; border-radius: 8px; padding: 8px 12px; margin-bottom: 16px; font-size: 13px;">
             <span style="color: #01579b;">👤 Connected as: <strong>{email}</strong></span>
         </div>
         """
 
-    # FIXED: Properly escaped JavaScript and removed conflicting template literals
-    return f"""
+_WELCOME_HEAD = """
 <div style="background: white; border-radius: 16px; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', system-ui, sans-serif; max-width: 100%; box-shadow: none;">
 
-    {email_display}
+    """
+
+_WELCOME_GREETING = """
 
     <div style="margin-bottom: 24px;">
         <h2 style="font-size: 20px; font-weight: 600; color: #111827; margin: 0 0 8px 0;">
@@ -180,49 +255,39 @@ def create_welcome_message_with_options(email: str = None) -> str:
         </p>
     </div>
 
-    {email_section}
-
-    <div style="display: grid; gap: 12px; margin: 20px 0;">
+    """
 
-        <button onclick="selectService('timesheet')" 
-                style="background: white; border: 2px solid #e5e7eb; border-radius: 12px; padding: 16px; text-align: left; cursor: pointer; transition: all 0.2s ease; display: flex; align-items: center; gap: 16px; width: 100%; font-family: inherit;"
-                onmouseover="this.style.borderColor='#0066cc'; this.style.boxShadow='0 4px 12px rgba(0,102,204,0.15)'; this.style.transform='translateY(-1px)';"
-                onmouseout="this.style.borderColor='#e5e7eb'; this.style.boxShadow='none'; this.style.transform='translateY(0)';">
-            <div style="font-size: 32px;">⏰</div>
-            <div style="flex: 1;">
-                <div style="font-weight: 600; color: #0066cc; font-size: 16px; margin-bottom: 4px;">
-                    Timesheet Management
-                </div>
-                <div style="color: #6b7280; font-size: 14px; line-height: 1.4;">
-                    Manage your Oracle and Mars timesheets with AI assistance
-                </div>
-            </div>
-            <div style="color: #9ca3af;">
-                <svg width="20" height="20" viewBox="0 0 20 20" fill="currentColor">
+_CHEVRON_SVG = """<svg width="20" height="20" viewBox="0 0 20 20" fill="currentColor">
                     <path fill-rule="evenodd" d="M7.293 14.707a1 1 0 010-1.414L10.586 10 7.293 6.707a1 1 0 011.414-1.414l4 4a1 1 0 010 1.414l-4 4a1 1 0 01-1.414 0z" clip-rule="evenodd"/>
-                </svg>
-            </div>
-        </button>
+                </svg>"""
 
-        <button onclick="selectService('hr_policy')" 
+def _service_button(key: str, cfg: ServiceCfg) -> str:
+    """Render one service-selection button from its API_CONFIG entry"""
+    color = cfg.color
+    rgb = ",".join(str(int(color[k:k + 2], 16)) for k in (1, 3, 5))
+    return f"""        <button onclick="selectService('{key}')" 
                 style="background: white; border: 2px solid #e5e7eb; border-radius: 12px; padding: 16px; text-align: left; cursor: pointer; transition: all 0.2s ease; display: flex; align-items: center; gap: 16px; width: 100%; font-family: inherit;"
-                onmouseover="this.style.borderColor='#7c3aed'; this.style.boxShadow='0 4px 12px rgba(124,58,237,0.15)'; this.style.transform='translateY(-1px)';"
+                onmouseover="this.style.borderColor='{color}'; this.style.boxShadow='0 4px 12px rgba({rgb},0.15)'; this.style.transform='translateY(-1px)';"
                 onmouseout="this.style.borderColor='#e5e7eb'; this.style.boxShadow='none'; this.style.transform='translateY(0)';">
-            <div style="font-size: 32px;">📋</div>
+            <div style="font-size: 32px;">{cfg.icon}</div>
             <div style="flex: 1;">
-                <div style="font-weight: 600; color: #7c3aed; font-size: 16px; margin-bottom: 4px;">
-                    HR Policy Assistant
+                <div style="font-weight: 600; color: {color}; font-size: 16px; margin-bottom: 4px;">
+                    {cfg.name}
                 </div>
                 <div style="color: #6b7280; font-size: 14px; line-height: 1.4;">
-                    Get answers about company policies and HR documents
+                    {cfg.description}
                 </div>
             </div>
             <div style="color: #9ca3af;">
-                <svg width="20" height="20" viewBox="0 0 20 20" fill="currentColor">
-                    <path fill-rule="evenodd" d="M7.293 14.707a1 1 0 010-1.414L10.586 10 7.293 6.707a1 1 0 011.414-1.414l4 4a1 1 0 010 1.414l-4 4a1 1 0 01-1.414 0z" clip-rule="evenodd"/>
-                </svg>
+                {_CHEVRON_SVG}
             </div>
-        </button>
+        </button>"""
+
+_WELCOME_BUTTONS = """
+
+    <div style="display: grid; gap: 12px; margin: 20px 0;">
+
+""" + "\n\n".join(_service_button(key, cfg) for key, cfg in API_CONFIG.items()) + """
     </div>
 
     <div style="background: #f9fafb; border: 1px solid #e5e7eb; border-radius: 8px; padding: 12px; margin-top: 16px;">
@@ -233,23 +298,27 @@ def create_welcome_message_with_options(email: str = None) -> str:
     </div>
 
 </div>
+"""
 
+# Plain string (not an f-string), so the JavaScript braces need no escaping.
+# Sent once in the page <head>; the welcome buttons rendered into the chat call it
+_SELECT_SERVICE_SCRIPT = """
 <script>
-function selectService(service) {{
+function selectService(service) {
     const emailInputs = document.querySelectorAll('input[type="email"], input[placeholder*="email"], input[placeholder*="Email"]');
     let email = '';
 
-    for (let input of emailInputs) {{
-        if (input.value && input.value.includes('@')) {{
+    for (let input of emailInputs) {
+        if (input.value && input.value.includes('@')) {
             email = input.value;
             break;
-        }}
-    }}
+        }
+    }
 
-    if (!email || !email.includes('@')) {{
+    if (!email || !email.includes('@')) {
         alert('Please enter your email address first.');
         return;
-    }}
+    }
 
     const messageInputs = document.querySelectorAll('textarea, input[type="text"]');
     const sendButtons = document.querySelectorAll('button');
@@ -257,44 +326,60 @@ function selectService(service) {{
     let messageInput = null;
     let sendButton = null;
 
-    for (let input of messageInputs) {{
-        if (input.placeholder && (input.placeholder.includes('message') || input.placeholder.includes('Message') || input.placeholder.includes('Type'))) {{
+    for (let input of messageInputs) {
+        if (input.placeholder && (input.placeholder.includes('message') || input.placeholder.includes('Message') || input.placeholder.includes('Type'))) {
             messageInput = input;
             break;
-        }}
-    }}
+        }
+    }
 
-    for (let button of sendButtons) {{
-        if (button.textContent && (button.textContent.includes('Send') || button.textContent.includes('🚀'))) {{
+    for (let button of sendButtons) {
+        if (button.textContent && (button.textContent.includes('Send') || button.textContent.includes('🚀'))) {
             sendButton = button;
             break;
-        }}
-    }}
+        }
+    }
 
-    if (messageInput && sendButton) {{
+    if (messageInput && sendButton) {
         const serviceName = service === 'timesheet' ? 'Timesheet Management' : 'HR Policy Assistant';
         messageInput.value = 'SELECT_SERVICE:' + service + ':' + email;
 
-        messageInput.dispatchEvent(new Event('input', {{ bubbles: true }}));
+        messageInput.dispatchEvent(new Event('input', { bubbles: true }));
 
-        setTimeout(() => {{
+        setTimeout(() => {
             sendButton.click();
-        }}, 100);
-    }}
-}}
+        }, 100);
+    }
+}
 </script>
 """
 
+def create_welcome_message_with_options(email: str = None) -> str:
+    """Create ChatGPT-style welcome message with clickable service options IN the chat - ALL SYNTAX FIXED"""
+    if email:
+        return _WELCOME_HEAD + _EMAIL_DISPLAY_TEMPLATE.format(email=email.translate(_HTML_ESCAPE)) + _WELCOME_GREETING + _WELCOME_BUTTONS
+    return _WELCOME_HEAD + _WELCOME_GREETING + _EMAIL_REQUIRED_HTML + _WELCOME_BUTTONS
+
+@lru_cache(maxsize=1)
+def _minute_stamp(minute: int) -> str:
+    """Chat timestamp for a minute since the epoch; only the current minute is kept"""
+    return datetime.fromtimestamp(minute * 60).strftime("%I:%M %p")
+
+def _cached_now() -> str:
+    """Current chat timestamp, formatted at most once per minute"""
+    return _minute_stamp(int(time.time() // 60))
+
 def format_chat_message(role: str, content: str, timestamp: str = None, service: str = None) -> str:
     """Format message with EXACT ChatGPT-style appearance"""
-    if timestamp is None:
-        timestamp = datetime.now().strftime("%I:%M %p")
+    timestamp = timestamp or _cached_now()
+    # Backends may send null or numbers; render them as text like the old f-string did
+    safe = str(content).translate(_HTML_ESCAPE)
 
     if role == "user":
         return f"""
 <div style="display: flex; justify-content: flex-end; margin-bottom: 16px;">
     <div style="background: #0084ff; color: white; padding: 12px 16px; border-radius: 18px 18px 4px 18px; max-width: 70%; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', system-ui, sans-serif; font-size: 15px; line-height: 1.4;">
-        {content}
+        {safe}
     </div>
 </div>"""
     else:
@@ -304,8 +389,8 @@ def format_chat_message(role: str, content: str, timestamp: str = None, service:
             config = API_CONFIG[service]
             service_info = f"""
             <div style="display: flex; align-items: center; gap: 8px; margin-bottom: 8px; padding-bottom: 8px; border-bottom: 1px solid #e5e7eb;">
-                <span style="font-size: 16px;">{config['icon']}</span>
-                <span style="font-weight: 600; color: {config['color']}; font-size: 14px;">{config['name']}</span>
+                <span style="font-size: 16px;">{config.icon}</span>
+                <span style="font-weight: 600; color: {config.color}; font-size: 14px;">{config.name}</span>
             </div>
             """
 
@@ -313,13 +398,11 @@ def format_chat_message(role: str, content: str, timestamp: str = None, service:
 <div style="display: flex; justify-content: flex-start; margin-bottom: 16px;">
     <div style="background: #f7f7f8; color: #374151; padding: 16px; border-radius: 18px 18px 18px 4px; max-width: 70%; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', system-ui, sans-serif; font-size: 15px; line-height: 1.5; border: 1px solid #e5e7eb;">
         {service_info}
-        <div style="white-space: pre-wrap;">{content}</div>
+        <div style="white-space: pre-wrap;">{safe}</div>
     </div>
 </div>"""
 
-def create_typing_indicator() -> str:
-    """Create ChatGPT-style typing indicator"""
-    return """
+_TYPING_HTML = """
 <div style="display: flex; justify-content: flex-start; margin-bottom: 16px;">
     <div style="background: #f7f7f8; padding: 16px; border-radius: 18px 18px 18px 4px; border: 1px solid #e5e7eb;">
         <div style="display: flex; align-items: center; gap: 8px;">
@@ -334,102 +417,112 @@ def create_typing_indicator() -> str:
 </div>
 """
 
+def create_typing_indicator() -> str:
+    """Create ChatGPT-style typing indicator"""
+    return _TYPING_HTML
+
+def append_message(state: ChatState, role: str, content: str, timestamp: str, service: str = None):
+    """Add a message to the history along with its rendered HTML, formatted once"""
+    state.conversation_history.append({
+        "role": role,
+        "content": content,
+        "timestamp": timestamp,
+        "service": service,
+        "html": format_chat_message(role, content, timestamp, service or state.selected_service)
+    })
+
+def render_history(state: ChatState) -> str:
+    """Render the conversation from the memoized per-message HTML"""
+    # join() materializes its input anyway; a list comprehension skips the generator frame
+    return "".join([msg["html"] for msg in state.conversation_history])
+
 # FIXED: Async generator function - all return statements with values changed to yield
 async def handle_message(message: str, state: ChatState):
     """Handle messages with service selection logic exactly like ChatGPT - ASYNC GENERATOR FIXED"""
+    now_str = _cached_now()
 
     # Check if this is a service selection message
     if message.startswith("SELECT_SERVICE:"):
         try:
-            parts = message.split(":")
-            selected_service = parts[1]
-            email = parts[2] if len(parts) > 2 else ""
-
-            if not validate_email(email):
-                error_msg = "❌ Please enter a valid email address to continue."
-                welcome_with_error = create_welcome_message_with_options()
-                yield welcome_with_error, "", state  # FIXED: Changed from return to yield
+            parts = message.split(":", 2)
+
+            if len(parts) != 3 or parts[1] not in API_CONFIG or not validate_email(parts[2]):
+                # The sentinel comes from the welcome buttons, which are still on screen;
+                # tell the user why nothing happened with a toast instead
+                gr.Warning("❌ Please enter a valid email address to continue.")
+                yield gr.update(), "", state  # FIXED: Changed from return to yield
                 return  # Exit without value
 
+            _, selected_service, email = parts
+
             # Update state
             state.selected_service = selected_service
             state.user_email = email
             state.is_service_selected = True
-            state.conversation_history = []
+            state.conversation_history = deque(maxlen=MAX_HISTORY)
 
             # Get service config
             config = API_CONFIG[selected_service]
 
             # Create service confirmation message
-            service_welcome = f"""Hello! I'm your **{config['name']}** assistant.
+            service_welcome = f"""Hello! I'm your **{config.name}** assistant.
 
-{config['description']}
+{config.description}
 
-I'm ready to help you with {config['name'].lower()}. What would you like to do today?
+I'm ready to help you with {config.name.lower()}. What would you like to do today?
 
-You can ask me questions, get help, or start working with your {config['name'].lower()}."""
+You can ask me questions, get help, or start working with your {config.name.lower()}."""
 
             # Add to conversation history
-            state.conversation_history.append({
-                "role": "assistant",
-                "content": service_welcome,
-                "timestamp": datetime.now().strftime("%I:%M %p"),
-                "service": selected_service
-            })
+            append_message(state, "assistant", service_welcome, now_str, selected_service)
 
             # Format the chat display
-            chat_html = format_chat_message("assistant", service_welcome, service=selected_service)
+            chat_html = render_history(state)
 
             yield chat_html, "", state  # FIXED: Changed from return to yield
             return  # Exit without value
 
         except Exception as e:
-            error_msg = f"Error selecting service: {str(e)}"
+            gr.Warning(f"Error selecting service: {str(e)}")
             yield create_welcome_message_with_options(), "", state  # FIXED: Changed from return to yield
             return  # Exit without value
 
     # Regular message handling
     if not state.is_service_selected:
-        # If no service selected, show welcome message
-        welcome_msg = create_welcome_message_with_options()
-        yield welcome_msg, "", state  # FIXED: Changed from return to yield
+        # No service yet, so the welcome message is still on screen; leave it in place
+        yield gr.update(), "", state  # FIXED: Changed from return to yield
         return  # Exit without value
 
     if not message.strip():
-        yield "", "", state  # FIXED: Changed from return to yield
+        # Nothing to send; keep the current conversation on screen
+        yield gr.update(), "", state  # FIXED: Changed from return to yield
         return  # Exit without value
 
     # Add user message to history
-    timestamp = datetime.now().strftime("%I:%M %p")
-    state.conversation_history.append({
-        "role": "user", 
-        "content": message,
-        "timestamp": timestamp
-    })
+    append_message(state, "user", message, now_str)
     state.message_count += 1
 
     # Build conversation HTML with user message
-    messages_html = ""
-    for msg in state.conversation_history:
-        messages_html += format_chat_message(
-            msg["role"], 
-            msg["content"], 
-            msg["timestamp"], 
-            msg.get("service", state.selected_service)
-        )
+    messages_html = render_history(state)
 
     # Add typing indicator
-    chat_with_typing = messages_html + create_typing_indicator()
+    chat_with_typing = messages_html + _TYPING_HTML
 
-    # Show typing state first
-    yield chat_with_typing, "", state
+    # Start the API call before showing typing state, so the request overlaps the UI update
+    typing_started = time.monotonic()
+    api_task = asyncio.create_task(call_api(state.selected_service, message, state.user_email))
 
-    # Small delay for realistic typing effect
-    await asyncio.sleep(1.2)
+    # Show typing state first; the bounce-dot CSS animates it while the API call runs
+    try:
+        yield chat_with_typing, "", state
+    except GeneratorExit:
+        # The client went away mid-turn; don't leave the request running unobserved
+        api_task.cancel()
+        raise
 
     try:
         # Call API
-        api_result = await call_api(state.selected_service, message, state.user_email)
+        api_result = await api_task
 
         if api_result["success"]:
             response = api_result["message"]
@@ -439,23 +532,16 @@ You can ask me questions, get help, or start working with your {config['name'].l
     except Exception as e:
         response = f"I apologize, but I encountered an unexpected error: {str(e)}\n\nPlease try again or check if the service is running."
 
+    # Keep the indicator up just long enough not to flicker; slower calls wait no extra
+    remaining = MIN_TYPING_SECONDS - (time.monotonic() - typing_started)
+    if remaining > 0:
+        await asyncio.sleep(remaining)
+
     # Add assistant response to history
-    state.conversation_history.append({
-        "role": "assistant",
-        "content": response, 
-        "timestamp": datetime.now().strftime("%I:%M %p"),
-        "service": state.selected_service
-    })
+    append_message(state, "assistant", response, _cached_now(), state.selected_service)
 
     # Create final chat display without typing indicator
-    final_messages_html = ""
-    for msg in state.conversation_history:
-        final_messages_html += format_chat_message(
-            msg["role"],
-            msg["content"], 
-            msg["timestamp"],
-            msg.get("service", state.selected_service)
-        )
+    final_messages_html = render_history(state)
 
     yield final_messages_html, "", state
 
@@ -607,6 +693,7 @@ def create_exact_chatgpt_interface():
             font=gr.themes.GoogleFont("Inter")
         ),
         css=custom_css,
+        head=_SELECT_SERVICE_SCRIPT,
         fill_height=True
     ) as app:
 
@@ -732,5 +819,19 @@ if __name__ == "__main__":
         show_error=True,
         debug=False,
         inbrowser=True,
-        favicon_path=None
+        favicon_path=None,
+        prevent_thread_lock=True
     )
+
+    # Wait here instead of app.block_thread(), which stops the server loop before we
+    # could close the pooled HTTP session on it (Starlette skips shutdown handlers
+    # when Gradio builds the app with a lifespan, so they can't be relied on)
+    try:
+        while True:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        print("🛑 Keyboard interruption in main thread... closing server.")
+    finally:
+        if HTTP_SESSION_LOOP is not None and HTTP_SESSION_LOOP.is_running():
+            asyncio.run_coroutine_threadsafe(close_http_session(), HTTP_SESSION_LOOP).result(timeout=5)
+        app.close()
@@ -277,9 +277,22 @@ async function sendMessage() {
     showTyping(true);
 
     try {
-        // Call API
-        const response = await callAPI(message);
-        addMessage('assistant', response);
+        // Call API, rendering streamed answers as tokens arrive
+        let streamedContent = null;
+        const response = await callAPI(message, (partialAnswer) => {
+            if (!streamedContent) {
+                showTyping(false);
+                streamedContent = addMessage('assistant', partialAnswer);
+            } else {
+                streamedContent.textContent = partialAnswer;
+            }
+        });
+
+        if (streamedContent) {
+            streamedContent.textContent = response;
+        } else {
+            addMessage('assistant', response);
+        }
 
         // Add to conversation history
         appState.conversationHistory.push(
@@ -307,8 +320,49 @@ async function sendMessage() {
     }
 }
 
+// Read a Server-Sent Events body from the RAG API: token events, then a sources event
+async function readEventStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let answer = '';
+    let sources = [];
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line; keep any partial event buffered
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const rawEvent of events) {
+            let eventName = 'message';
+            let data = '';
+            for (const line of rawEvent.split('\n')) {
+                if (line.startsWith('event: ')) {
+                    eventName = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            }
+            if (!data) continue;
+
+            if (eventName === 'sources') {
+                sources = JSON.parse(data);
+            } else {
+                answer += JSON.parse(data);
+                if (onToken) onToken(answer);
+            }
+        }
+    }
+
+    return { answer, sources };
+}
+
 // IMPROVED API CALL FUNCTION with proper error handling and CORS support
-async function callAPI(message) {
+async function callAPI(message, onToken) {
     const serviceConfig = API_CONFIG[appState.selectedService];
 
     if (!serviceConfig) {
@@ -342,7 +396,10 @@ async function callAPI(message) {
             method: serviceConfig.method,
             headers: {
                 'Content-Type': 'application/json',
-                'Accept': 'application/json',
+                // The RAG API streams answers as SSE when asked to
+                'Accept': appState.selectedService === 'hr-policy'
+                    ? 'text/event-stream, application/json'
+                    : 'application/json',
                 // Add CORS headers for cross-origin requests
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, GET, OPTIONS',
@@ -365,7 +422,10 @@ async function callAPI(message) {
             }
         }
 
-        const data = await response.json();
+        const contentType = response.headers.get('Content-Type') || '';
+        const data = contentType.includes('text/event-stream')
+            ? await readEventStream(response, onToken)
+            : await response.json();
         console.log('API Response:', data);
 
         // Handle different response formats based on your APIs
@@ -429,6 +489,8 @@ function addMessage(role, content) {
     setTimeout(() => {
         elements.messagesContainer.scrollTop = elements.messagesContainer.scrollHeight;
     }, 50);
+
+    return messageContent;
 }
 
 function showTyping(show) {
@@ -0,0 +1,18 @@
+"""
+PDF page loading for the HR Policy RAG API
+Kept free of import-time side effects so process-pool workers can import it cheaply
+"""
+
+from typing import List
+from langchain.document_loaders import PyPDFLoader
+from langchain.schema import Document
+
+def load_pdf(pdf_file: str) -> List[Document]:
+    """Load one PDF into page Documents, or none if it cannot be read (may run in a worker process)"""
+    try:
+        documents = PyPDFLoader(pdf_file).load()
+        print(f"✅ Loaded {len(documents)} pages from {pdf_file}")
+        return documents
+    except Exception as e:
+        print(f"❌ Error loading {pdf_file}: {str(e)}")
+        return []